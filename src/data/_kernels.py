@@ -0,0 +1,48 @@
+# src/data/_kernels.py
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True)
+def rolling_means(gs, gc, pts, group_starts, window, out_gs, out_gc, out_pts):
+    """
+    Calcula la media de los `window` partidos previos (closed='left') de cada equipo.
+
+    Las entradas deben estar ordenadas por equipo y fecha; el equipo k ocupa las
+    posiciones group_starts[k]:group_starts[k + 1]. Se mantiene una suma acumulada
+    que suma el partido nuevo y resta el que sale de la ventana, por lo que el costo
+    es O(N) sin importar el tamaño de la ventana. Las posiciones con menos de
+    `window` partidos previos quedan en NaN.
+
+    Args:
+        gs, gc, pts: Goles anotados, goles recibidos y puntos por partido.
+        group_starts: Inicio de cada equipo, con la longitud total como último elemento.
+        window: Número de partidos previos a promediar.
+        out_gs, out_gc, out_pts: Arreglos de salida, de la misma longitud que las entradas.
+    """
+    for k in prange(len(group_starts) - 1):
+        start = group_starts[k]
+        end = group_starts[k + 1]
+        s_gs = 0.0
+        s_gc = 0.0
+        s_pts = 0.0
+        nobs = 0
+        for i in range(start, end):
+            # closed='left': la ventana de la fila i termina en el partido anterior
+            if nobs >= window:
+                out_gs[i] = s_gs / window
+                out_gc[i] = s_gc / window
+                out_pts[i] = s_pts / window
+            else:
+                out_gs[i] = np.nan
+                out_gc[i] = np.nan
+                out_pts[i] = np.nan
+
+            s_gs += gs[i]
+            s_gc += gc[i]
+            s_pts += pts[i]
+            nobs += 1
+            if nobs > window:
+                s_gs -= gs[i - window]
+                s_gc -= gc[i - window]
+                s_pts -= pts[i - window]
@@ -4,92 +4,164 @@ import os
 import pandas as pd
 import numpy as np
 
-def calculate_rolling_features(group: pd.DataFrame, window_size: int = 5) -> pd.DataFrame:
-    """Calcula características rodantes para un equipo."""
-    group = group.sort_values('date')
-    
-    # Goles y Puntos
-    rolling_stats = group[['goals_scored', 'goals_conceded', 'points']].rolling(window=window_size, closed='left').mean()
-    group['avg_goals_scored'] = rolling_stats['goals_scored']
-    group['avg_goals_conceded'] = rolling_stats['goals_conceded']
-    group['avg_points'] = rolling_stats['points']
-    
-    return group
+# Importación relativa al usarse como módulo (src.data.process); directa al
+# ejecutarse como script (python src/data/process.py), como hace dvc.yaml
+try:
+    from ._kernels import rolling_means
+except ImportError:
+    from _kernels import rolling_means
+
+# Número de partidos previos que se promedian para medir la forma de un equipo
+WINDOW_SIZE = 5
+
+
+def rolling_team_form(team_stats_df: pd.DataFrame, window_size: int = WINDOW_SIZE) -> pd.DataFrame:
+    """
+    Calcula la media rodante de goles y puntos de los partidos previos de cada equipo.
+
+    Args:
+        team_stats_df: DataFrame por equipo y partido, ordenado por 'team' y 'date',
+            con 'team' categórico.
+        window_size: Número de partidos previos a promediar.
+
+    Returns:
+        Un DataFrame con las medias rodantes, alineado con la entrada.
+    """
+    # Como la entrada está ordenada por equipo, los límites de cada equipo salen de
+    # buscar cada código de categoría en el arreglo de códigos
+    team_codes = team_stats_df['team'].cat.codes.to_numpy()
+    n_teams = len(team_stats_df['team'].cat.categories)
+    group_starts = np.searchsorted(team_codes, np.arange(n_teams + 1))
+
+    n_rows = len(team_stats_df)
+    out_gs = np.empty(n_rows, dtype=np.float32)
+    out_gc = np.empty(n_rows, dtype=np.float32)
+    out_pts = np.empty(n_rows, dtype=np.float32)
+    rolling_means(
+        team_stats_df['goals_scored'].to_numpy(),
+        team_stats_df['goals_conceded'].to_numpy(),
+        team_stats_df['points'].to_numpy(),
+        group_starts,
+        window_size,
+        out_gs,
+        out_gc,
+        out_pts,
+    )
+    return pd.DataFrame(
+        {'avg_goals_scored': out_gs, 'avg_goals_conceded': out_gc, 'avg_points': out_pts},
+        index=team_stats_df.index,
+    )
+
+
+# La primera llamada al kernel incluye la compilación JIT; la hacemos al importar
+# el módulo sobre un DataFrame mínimo
+rolling_team_form(
+    pd.DataFrame({
+        'team': pd.Categorical(['_']),
+        'goals_scored': np.zeros(1, dtype=np.int8),
+        'goals_conceded': np.zeros(1, dtype=np.int8),
+        'points': np.zeros(1, dtype=np.int8),
+    })
+)
+
 
 def process_data(input_path: str, output_path: str):
     """
     Limpia los datos crudos y genera características para el modelo.
     """
     print(f"Cargando datos crudos desde {input_path}...")
-    df = pd.read_csv(input_path)
+    # Los datos crudos son un dataset Parquet particionado por temporada ('calendar')
+    df = pd.read_parquet(input_path)
 
     # --- 1. Limpieza de Datos ---
     # Convertir a datetime para poder ordenar
     df['date'] = pd.to_datetime(df['date'])
-    # Eliminar partidos futuros que no tienen marcador
-    df = df[df['score'].notna()].copy()
-    
-    # Extraer goles del marcador (ej. '2–1')
-    score_split = df['score'].str.split('–', expand=True)
-    df['home_goals'] = pd.to_numeric(score_split[0])
-    df['away_goals'] = pd.to_numeric(score_split[1])
+
+    # Extraer goles del marcador (ej. '2–1') en una sola pasada de regex.
+    # Eliminamos los partidos futuros, que no tienen marcador, y los que no tengan el formato esperado
+    goals = df['score'].str.extract(r'(\d+)\D(\d+)').dropna()
+    df = df.loc[goals.index].copy()
+    # Los goles caben en int8; reducir el ancho del tipo reduce la memoria que recorren groupby y rolling
+    goals = goals.astype('int8')
+    df['home_goals'] = goals[0]
+    df['away_goals'] = goals[1]
+
+    # Los equipos comparten un mismo tipo categórico para que las uniones comparen códigos enteros
+    team_dtype = pd.CategoricalDtype(np.union1d(df['home_team'].unique(), df['away_team'].unique()))
+    df['home_team'] = df['home_team'].astype(team_dtype)
+    df['away_team'] = df['away_team'].astype(team_dtype)
     
-    # Definir el resultado (nuestra variable objetivo)
-    # H: Home Win, D: Draw, A: Away Win
-    df.loc[df['home_goals'] > df['away_goals'], 'result'] = 'H'
-    df.loc[df['home_goals'] == df['away_goals'], 'result'] = 'D'
-    df.loc[df['home_goals'] < df['away_goals'], 'result'] = 'A'
+    # Definir el resultado (nuestra variable objetivo) como código entero desde el inicio
+    # 0 = H: Home Win, 1 = D: Draw, 2 = A: Away Win
+    home_goals = df['home_goals'].to_numpy()
+    away_goals = df['away_goals'].to_numpy()
+    result_code = (1 - np.sign(home_goals - away_goals)).astype(np.int8)
+    df['result'] = pd.Categorical.from_codes(result_code, categories=['H', 'D', 'A'])
 
     # --- 2. Preparar datos para Feature Engineering ---
-    # Creamos una vista de los datos por equipo para calcular sus estadísticas por partido
-    home_df = df[['date', 'home_team', 'home_goals', 'away_goals', 'result']].rename(
-        columns={'home_team': 'team', 'home_goals': 'goals_scored', 'away_goals': 'goals_conceded'}
-    )
-    home_df['location'] = 'H'
-    
-    away_df = df[['date', 'away_team', 'away_goals', 'home_goals', 'result']].rename(
-        columns={'away_team': 'team', 'away_goals': 'goals_scored', 'home_goals': 'goals_conceded'}
-    )
-    away_df['location'] = 'A'
-    
-    # Unimos todo en un solo DataFrame
-    team_stats_df = pd.concat([home_df, away_df]).sort_values('date')
-    
-    # Definimos las condiciones lógicas para cada resultado posible
-    conditions = [
-        # Condición 1: El equipo era local (H) Y el resultado fue victoria local (H)
-        (team_stats_df['location'] == 'H') & (team_stats_df['result'] == 'H'),
-        # Condición 2: El equipo era visitante (A) Y el resultado fue victoria visitante (A)
-        (team_stats_df['location'] == 'A') & (team_stats_df['result'] == 'A'),
-        # Condición 3: El resultado fue un empate (D)
-        (team_stats_df['result'] == 'D')
-    ]
-
-    # Definimos los valores (puntos) correspondientes a cada condición
-    choices = [3, 3, 1]
-
-    # Usamos np.select para crear la columna de puntos.
-    # Si ninguna condición se cumple (es decir, una derrota), el valor por defecto es 0.
-    team_stats_df['points'] = np.select(conditions, choices, default=0)
+    # Creamos una vista de los datos por equipo para calcular sus estadísticas por partido:
+    # primero todos los registros como local y después todos como visitante.
+    # La localía también es un código entero: 0 = local (H), 1 = visitante (A)
+    n_matches = len(df)
+    location_code = np.repeat(np.array([0, 1], dtype=np.int8), n_matches)
+
+    # Puntos sin ramas: el equipo gana si el resultado es H siendo local (0, 0) o A siendo
+    # visitante (1, 2), es decir, si result_code == 2 * location_code; el empate da 1 punto
+    team_result_code = np.tile(result_code, 2)
+    win = team_result_code == 2 * location_code
+    draw = team_result_code == 1
+    points = (3 * win + draw).astype(np.int8)
+
+    team_stats_df = pd.DataFrame({
+        'date': np.concatenate([df['date'].to_numpy(), df['date'].to_numpy()]),
+        'team': pd.Categorical.from_codes(
+            np.concatenate([df['home_team'].cat.codes.to_numpy(), df['away_team'].cat.codes.to_numpy()]),
+            dtype=team_dtype,
+        ),
+        'goals_scored': np.concatenate([home_goals, away_goals]),
+        'goals_conceded': np.concatenate([away_goals, home_goals]),
+        'location': location_code,
+        'points': points,
+    })
     
     # --- 3. Calcular Features Rodantes ---
-    # Agrupamos por equipo y aplicamos la función de cálculo de features
+    # Ordenamos una sola vez por equipo y fecha, y calculamos las medias rodantes
+    # de todos los equipos en una única pasada del kernel de numba
     print("Calculando características rodantes (forma del equipo)...")
-    processed_df = team_stats_df.groupby('team', group_keys=False).apply(calculate_rolling_features)
+    team_stats_df = team_stats_df.sort_values(['team', 'date']).reset_index(drop=True)
+    rolling_stats = rolling_team_form(team_stats_df)
+    team_stats_df[['avg_goals_scored', 'avg_goals_conceded', 'avg_points']] = rolling_stats
+
+    # Los primeros WINDOW_SIZE partidos de cada equipo no tienen promedios: los
+    # descartamos por posición dentro del equipo antes de unir, sin revisar NaN columna por columna
+    within_team_idx = team_stats_df.groupby('team', observed=True).cumcount().to_numpy()
+    processed_df = team_stats_df[within_team_idx >= WINDOW_SIZE]
     
     # --- 4. Unir Features al Dataset Original ---
-    # Renombramos columnas para distinguir entre local y visitante
-    home_features = processed_df[processed_df['location'] == 'H'].rename(columns=lambda x: f"home_{x}" if x not in ['date', 'team'] else x)
-    away_features = processed_df[processed_df['location'] == 'A'].rename(columns=lambda x: f"away_{x}" if x not in ['date', 'team'] else x)
-    
-    # Unimos de vuelta al dataframe original
-    final_df = df.merge(home_features[['date', 'team', 'home_avg_goals_scored', 'home_avg_goals_conceded', 'home_avg_points']], 
-                        left_on=['date', 'home_team'], right_on=['date', 'team'])
-    final_df = final_df.merge(away_features[['date', 'team', 'away_avg_goals_scored', 'away_avg_goals_conceded', 'away_avg_points']],
-                          left_on=['date', 'away_team'], right_on=['date', 'team'])
+    # Separamos una sola vez por localía y renombramos las features para distinguirlas.
+    # La llave (date, team) queda como índice ordenado, para que cada unión use el
+    # índice monótono del lado pequeño en lugar de reconstruir una tabla hash
+    feature_cols = ['avg_goals_scored', 'avg_goals_conceded', 'avg_points']
+    is_home = processed_df['location'].to_numpy() == 0
+    home_features = (
+        processed_df.loc[is_home, ['date', 'team', *feature_cols]]
+        .rename(columns={c: f"home_{c}" for c in feature_cols})
+        .set_index(['date', 'team'])
+        .sort_index()
+    )
+    away_features = (
+        processed_df.loc[~is_home, ['date', 'team', *feature_cols]]
+        .rename(columns={c: f"away_{c}" for c in feature_cols})
+        .set_index(['date', 'team'])
+        .sort_index()
+    )
 
-    # Limpiamos columnas redundantes y filas sin datos de promedios (las primeras de cada temporada)
-    final_df = final_df.drop(columns=['team_x', 'team_y']).dropna()
+    # Unimos de vuelta al dataframe original; validate evita duplicar partidos en silencio
+    final_df = (
+        df.merge(home_features, left_on=['date', 'home_team'], right_index=True, how='inner', sort=False, validate='1:1')
+        .merge(away_features, left_on=['date', 'away_team'], right_index=True, how='inner', sort=False, validate='1:1')
+        .reset_index(drop=True)
+    )
 
     # --- 5. Guardar el resultado ---
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -105,7 +177,7 @@ if __name__ == '__main__':
         "--input", 
         type=str, 
         required=True, 
-        help="Ruta del archivo CSV de entrada (datos crudos)."
+        help="Directorio del dataset Parquet de entrada (datos crudos)."
     )
     parser.add_argument(
         "--output", 
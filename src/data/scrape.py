@@ -3,22 +3,67 @@ import argparse
 import os
 import time
 import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import lxml.etree
+import lxml.html
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from requests.adapters import HTTPAdapter
 
 # URL base para los resultados de la Liga MX en FBref.
 # El primer '{year}' es para la temporada (ej. 2023-2024), el segundo para el ID de la tabla.
 BASE_URL = "https://fbref.com/en/comps/31/{year}/schedule/{year}-Liga-MX-Scores-and-Fixtures"
 
-def scrape_season_data(season: str) -> pd.DataFrame:
+# Expresiones regulares compiladas una sola vez para el parseo de la tabla
+# Tipo y año de temporada (ej. 'Apertura 2023')
+SEASON_RE = re.compile(r"(Apertura|Clausura)\s(\d{4})", re.IGNORECASE)
+# Marcador sin penales (ej. '(4) 1–1 (3)' -> '1–1')
+SCORE_RE = re.compile(r"(\d+–\d+)")
+
+# Segundos mínimos entre peticiones al servidor, para ser respetuosos con FBref
+REQUEST_INTERVAL = 3
+
+# Caché en disco de las páginas descargadas, para no volver a pedirlas en cada ejecución
+CACHE_NAME = ".fbref_cache"
+CACHE_EXPIRE_AFTER = 60 * 60 * 24  # 1 día
+
+
+class RateLimiter:
+    """
+    Limita las peticiones compartidas entre hilos a una cada `interval` segundos.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_request = time.monotonic()
+
+    def wait(self):
+        """Bloquea al hilo que llama hasta que le toque hacer su petición."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def scrape_season_data(season: str, session: requests.Session | None = None, rate_limiter: RateLimiter | None = None) -> pd.DataFrame:
     """
     Extrae los datos de la tabla de resultados de una temporada de la Liga MX.
 
     Args:
         season: La temporada a extraer, en formato 'YYYY-YYYY' (ej. '2023-2024').
+        session: Sesión HTTP a reutilizar entre peticiones. Si es None se usa `requests` directamente.
+        rate_limiter: Limitador compartido que espacía las peticiones al servidor.
 
     Returns:
         Un DataFrame de pandas con los datos de los partidos.
@@ -31,104 +76,124 @@ def scrape_season_data(season: str) -> pd.DataFrame:
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
     }
     
+    # Las páginas vigentes en caché no llegan al servidor, así que no esperan turno.
+    # La caché conserva las entradas expiradas, por eso no basta con que la llave exista
+    is_cached = False
+    if isinstance(session, requests_cache.CachedSession):
+        cache_key = session.cache.create_key(requests.Request('GET', url))
+        cached_response = session.cache.get_response(cache_key)
+        is_cached = cached_response is not None and not cached_response.is_expired
+    if rate_limiter is not None and not is_cached:
+        rate_limiter.wait()
+
     try:
-        response = requests.get(url, headers=headers)
+        response = (session or requests).get(url, headers=headers)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener la página: {e}")
         return pd.DataFrame()
 
-    # Usamos BeautifulSoup para parsear el HTML
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # La tabla de resultados suele tener un ID que podemos usar como selector
+    # Parseamos el HTML con lxml (en C) y usamos el ID de la tabla de resultados como selector
     #table_id = f"sched_{season}_31_1"
-    table_id = f"sched_all"
-    table = soup.find('table', {'id': table_id})
+    table_id = "sched_all"
+    try:
+        tree = lxml.html.fromstring(response.text)
+    except lxml.etree.ParserError:
+        # Una respuesta vacía no es un documento HTML válido para lxml
+        tree = None
+    tables = tree.xpath(f"//table[@id='{table_id}']") if tree is not None else []
 
-    if not table:
+    if not tables:
         print(f"No se encontró la tabla con el ID '{table_id}'.")
         return pd.DataFrame()
 
-    # Extraemos los datos de la tabla
-    rows = table.find('tbody').find_all('tr')
+    # Extraemos el texto de todas las celdas de cada fila, saltando las cabeceras intermedias,
+    # y el enlace al reporte del partido. El resto del procesamiento es vectorizado.
+    rows = []
+    report_links = []
+    for tr in tables[0].xpath("./tbody/tr[not(contains(@class, 'thead'))]"):
+        cells = tr.xpath("./th|./td")
+        rows.append([cell.text_content().strip() for cell in cells])
+        report_link = cells[13].xpath(".//a/@href") if len(cells) > 13 else []
+        report_links.append(report_link[0] if report_link else None)
+
+    if not rows:
+        return pd.DataFrame()
 
-    season_type_global = None
-    season_year_global = None
-    
-    match_data = []
-    for row in rows:
-        # Saltamos las filas que son cabeceras intermedias en la tabla
-        if row.find_all(['th', 'tr'], {'class': 'thead'}):
-            continue
-
-        cells = row.find_all(['th', 'td'])
-        # Si la fila no tiene suficientes celdas, la ignoramos
-        if len(cells) < 10 or cells[1].text.strip() == 'Wk':
-            continue
-
-        # Saltamos filas intermedias vacias
-        if not cells[4].text.strip():
-            continue
-
-        # Extraemos tipo de temporada
-        ptr = r"(Apertura|Clausura)\s\d{4}"
-        match_season = re.search(ptr, cells[0].text.strip(), re.IGNORECASE)
-
-        season_type = match_season.group().split(' ')[0] if match_season else None
-        season_year = match_season.group().split(' ')[1] if match_season else None
-
-        season_type_global = season_type if season_type else season_type_global
-        season_year_global = season_year if season_year else season_year_global
-
-        if "Regular Season" in cells[0].text.strip():
-            season_phase = "Regular Season"
-        else:
-            season_phase = "Liguilla"
-
-        # Extraemos fases de liguilla
-        week = None
-        if "Quarter" in cells[0].text.strip():
-            if 'Leg 1' in cells[14].text.strip():
-                week = "Cuartos Ida"
-            else:
-                week = "Cuartos Vuelta"
-        elif "Semi" in cells[0].text.strip():
-            if 'Leg 1' in cells[14].text.strip():
-                week = "Semifinal Ida"
-            else:
-                week = "Semifinal Vuelta"
-        elif "Finals" in cells[0].text.strip():
-            if 'Leg 1' in cells[14].text.strip():
-                week = "Final Ida"
-            else:
-                week = "Final Vuelta"
-
-        # Checa el marcador por si hay penales, por el momento se eliminan
-        ptr = r'\d+–\d+'
-        fix_score = re.search(ptr, cells[7].text.strip())
-            
-        match_info = {
-            'week': cells[1].text.strip() or week,
-            'day': cells[2].text.strip(),
-            'date': cells[3].text.strip(),
-            'time': cells[4].text.strip(),
-            'home_team': cells[5].text.strip(),
-            'xgh': cells[6].text.strip(),
-            'score': fix_score.group() if fix_score else cells[7].text.strip(),
-            'xga': cells[8].text.strip(),
-            'away_team': cells[9].text.strip(),
-            'attendance': cells[10].text.strip(),
-            'venue': cells[11].text.strip().replace('...', '').strip(),
-            'referee': cells[12].text.strip(),
-            'match_report_url': cells[13].find('a')['href'] if cells[13].find('a') else None,
-            'season_type': season_type_global,
-            'season_year': season_year_global,
-            'seeason_phase': season_phase 
-        }
-        match_data.append(match_info)
-
-    return pd.DataFrame(match_data)
+    # Las celdas se guardan como cadenas de Arrow (búferes contiguos), de modo que los
+    # str.contains/extract/replace/strip siguientes usan los kernels de Arrow
+    cells = pd.DataFrame(rows, dtype='string[pyarrow]').fillna('')
+    report_links = pd.Series(report_links, index=cells.index, dtype='string[pyarrow]')
+
+    # Saltamos las cabeceras repetidas sin la clase 'thead' y las filas intermedias vacías
+    valid_rows = (cells[1] != 'Wk') & (cells[4] != '')
+    cells = cells[valid_rows]
+    report_links = report_links[valid_rows]
+    round_text = cells[0]
+
+    # Extraemos tipo y año de temporada; las filas que no lo indican heredan el último visto
+    match_season = round_text.str.extract(SEASON_RE).ffill()
+
+    season_phase = np.where(round_text.str.contains('Regular Season', regex=False), 'Regular Season', 'Liguilla')
+
+    # Extraemos fases de liguilla
+    first_leg = cells[14].str.contains('Leg 1', regex=False)
+    week = np.select(
+        [
+            round_text.str.contains('Quarter', regex=False) & first_leg,
+            round_text.str.contains('Quarter', regex=False),
+            round_text.str.contains('Semi', regex=False) & first_leg,
+            round_text.str.contains('Semi', regex=False),
+            round_text.str.contains('Finals', regex=False) & first_leg,
+            round_text.str.contains('Finals', regex=False),
+        ],
+        ['Cuartos Ida', 'Cuartos Vuelta', 'Semifinal Ida', 'Semifinal Vuelta', 'Final Ida', 'Final Vuelta'],
+        default=None,
+    )
+
+    # Checa el marcador por si hay penales, por el momento se eliminan
+    fix_score = cells[7].str.extract(SCORE_RE, expand=False)
+
+    return pd.DataFrame({
+        'week': cells[1].where(cells[1] != '', week),
+        'day': cells[2],
+        'date': cells[3],
+        'time': cells[4],
+        'home_team': cells[5],
+        'xgh': cells[6],
+        'score': fix_score.fillna(cells[7]),
+        'xga': cells[8],
+        'away_team': cells[9],
+        'attendance': cells[10],
+        'venue': cells[11].str.replace('...', '', regex=False).str.strip(),
+        'referee': cells[12],
+        'match_report_url': report_links,
+        'season_type': match_season[0],
+        'season_year': match_season[1],
+        'seeason_phase': season_phase,
+    }).reset_index(drop=True)
+
+
+def write_season_partition(season_df: pd.DataFrame, season: str, root_path: str):
+    """
+    Escribe los partidos de una temporada como partición 'calendar=<season>' del dataset Parquet.
+
+    Args:
+        season_df: DataFrame devuelto por `scrape_season_data`.
+        season: La temporada, en formato 'YYYY-YYYY'; se usa como valor de 'calendar'.
+        root_path: Directorio raíz del dataset Parquet.
+    """
+    # Todas las columnas extraídas son texto; fijar el esquema evita que una temporada
+    # con una columna vacía se escriba con un tipo distinto al de las demás
+    season_df = season_df.assign(calendar=season)
+    schema = pa.schema([(col, pa.string()) for col in season_df.columns])
+    table = pa.Table.from_pandas(season_df, schema=schema, preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        root_path=root_path,
+        partition_cols=['calendar'],
+        existing_data_behavior='delete_matching',
+    )
 
 
 if __name__ == '__main__':
@@ -141,7 +206,12 @@ if __name__ == '__main__':
         "--output", 
         type=str, 
         required=True, 
-        help="Ruta del archivo CSV de salida."
+        help="Directorio del dataset Parquet de salida (particionado por temporada)."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Descarga de nuevo todas las páginas sin usar la caché en disco."
     )
     args = parser.parse_args()
 
@@ -151,20 +221,34 @@ if __name__ == '__main__':
         f"{year}-{year+1}" for year in range(current_year - 6, current_year - 1)
     ]
 
-    all_seasons_df = []
-    for s in seasons:
-        season_df = scrape_season_data(s)
-        if not season_df.empty:
-            season_df['calendar'] = s
-            all_seasons_df.append(season_df)
-        time.sleep(3)  # Pausa de 3 segundos para ser respetuosos con el servidor
+    # Descargamos las temporadas en paralelo reutilizando conexiones (y la caché en disco,
+    # salvo con --no-cache); el limitador compartido mantiene una petición cada
+    # REQUEST_INTERVAL segundos
+    if args.no_cache:
+        session = requests.Session()
+    else:
+        session = requests_cache.CachedSession(CACHE_NAME, expire_after=CACHE_EXPIRE_AFTER)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount("https://", adapter)
+    rate_limiter = RateLimiter(REQUEST_INTERVAL)
+
+    # Escribimos cada temporada en su partición en cuanto se termina de extraer,
+    # en lugar de acumular todas en memoria y concatenarlas al final. Se escribe en un
+    # directorio temporal que reemplaza a la salida al terminar, para no conservar
+    # particiones de temporadas que ya no están en la ventana o que fallaron esta vez
+    tmp_output = os.path.normpath(args.output) + ".tmp"
+    shutil.rmtree(tmp_output, ignore_errors=True)
+    os.makedirs(tmp_output)
+    total_matches = 0
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        season_dfs = executor.map(lambda s: scrape_season_data(s, session, rate_limiter), seasons)
+        for s, season_df in zip(seasons, season_dfs):
+            if not season_df.empty:
+                write_season_partition(season_df, s, tmp_output)
+                total_matches += len(season_df)
+
+    shutil.rmtree(args.output, ignore_errors=True)
+    os.replace(tmp_output, args.output)
 
-    # Concatenamos los datos de todas las temporadas y los guardamos
-    final_df = pd.concat(all_seasons_df, ignore_index=True)
-    
-    # Aseguramos que el directorio de salida exista
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    final_df.to_csv(args.output, index=False)
-    
     print(f"\n[SUCCESS] Datos guardados exitosamente en '{args.output}'.")
-    print(f"Total de partidos extraídos: {len(final_df)}")
\ No newline at end of file
+    print(f"Total de partidos extraídos: {total_matches}")
@@ -0,0 +1,33 @@
+# tests/test_process.py
+import numpy as np
+import pandas as pd
+
+from src.data.process import WINDOW_SIZE, rolling_team_form
+
+
+def test_rolling_team_form_matches_pandas_rolling():
+    # 'B' no tiene partidos y 'D' juega menos de WINDOW_SIZE; el resto con tamaños distintos
+    team_dtype = pd.CategoricalDtype(['A', 'B', 'C', 'D', 'E'])
+    sizes = {'A': 12, 'C': 7, 'D': WINDOW_SIZE - 2, 'E': WINDOW_SIZE + 1}
+    teams = np.repeat(list(sizes), list(sizes.values()))
+
+    rng = np.random.default_rng(0)
+    n = len(teams)
+    team_stats_df = pd.DataFrame({
+        'team': pd.Categorical(teams, dtype=team_dtype),
+        'goals_scored': rng.integers(0, 6, n).astype(np.int8),
+        'goals_conceded': rng.integers(0, 6, n).astype(np.int8),
+        'points': rng.choice([0, 1, 3], n).astype(np.int8),
+    })
+
+    result = rolling_team_form(team_stats_df)
+
+    expected = (
+        team_stats_df.groupby('team', observed=True)[['goals_scored', 'goals_conceded', 'points']]
+        .rolling(WINDOW_SIZE, closed='left').mean()
+        .reset_index(level=0, drop=True)
+        .sort_index()
+    )
+    expected.columns = ['avg_goals_scored', 'avg_goals_conceded', 'avg_points']
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, atol=1e-5)